@@ -0,0 +1,304 @@
+"""
+Offline archive ingestion: triage exported mail (.mbox files and directories
+of .eml files) to backfill the decision log and tune rules.
+
+Runs the same heuristics + ladder (ladder.classify) as the server, in-process
+(no HTTP, no API key), across a process pool. The parent only scans the archive
+for message boundaries (memory-mapped) and keeps a fixed number of chunks in
+flight; workers map the file themselves and parse their own slices, so memory
+stays bounded regardless of archive size.
+
+priority_level is always the pure ladder decision (what learned.py trains on).
+With a model (--model or LEARNED_MODEL_PATH), its confident rule 4/5 pick is
+logged separately in learned_level, scored one vectorized batch per chunk.
+
+Usage:
+    python archive_ingest.py Takeout.mbox exported_eml/ -o decisions.csv
+    python archive_ingest.py archive.mbox -o decisions.jsonl --workers 8 --me you@example.com
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import time
+from collections import deque
+from itertools import islice
+from email.header import decode_header, make_header
+from email.parser import BytesParser
+from email.utils import parseaddr
+from multiprocessing import Pool, cpu_count
+
+from heuristics import infer_human_sender, is_auto_submitted, is_bulk_sender, is_list_mail
+from html_text import html_to_text
+from learned import BODY_CHARS, load_model
+from ladder import LEARNED_LEVELS, classify, learned_pick
+from schemas import ClassifyEmailRequest
+
+OUTPUT_FIELDS = [
+    "date", "message_id", "sender", "subject",
+    "priority_level", "folder", "notify", "reason",
+    "human_sender", "is_newsletter", "body_preview",
+    "learned_level", "learned_confidence",  # model's pick, never used as a training label
+    "my_override",  # left blank: fill in while reviewing (see SCHEMA.md "My Override")
+    "source", "error",
+]
+
+CHUNKSIZE = 64      # messages per task sent to a worker
+INFLIGHT_PER_WORKER = 4  # chunks queued per worker before the parent waits
+WRITE_BATCH = 2000  # rows buffered before each bulk write
+
+# compat32 keeps headers as plain strings; the default policy's header registry
+# dominated per-message cost, so only the headers we show are decoded (_header)
+_parser = BytesParser()
+_maps: dict[str, mmap.mmap] = {}  # per-worker cache of mapped mbox files
+_my_addr = ""
+_model = None
+_min_confidence = 0.8
+
+
+# ---------- Archive scanning (parent process) ----------
+
+def iter_mbox_spans(path: str):
+    # mbox messages start with a "From " line at the beginning of the file or after a newline
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0 if mm[:5] == b"From " else mm.find(b"\nFrom ")
+            while pos != -1:
+                if mm[pos:pos + 1] == b"\n":
+                    pos += 1
+                body_start = mm.find(b"\n", pos)
+                if body_start == -1:
+                    return
+                body_start += 1
+                nxt = mm.find(b"\nFrom ", body_start)
+                end = len(mm) if nxt == -1 else nxt
+                if end > body_start:
+                    yield (path, body_start, end)
+                pos = nxt
+
+
+def iter_chunks(jobs, size: int = CHUNKSIZE):
+    jobs = iter(jobs)
+    while chunk := list(islice(jobs, size)):
+        yield chunk
+
+
+def iter_jobs(paths: list[str]):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(".eml"):
+                        yield (os.path.join(root, name), 0, -1)
+        elif path.lower().endswith(".eml"):
+            yield (path, 0, -1)
+        else:
+            yield from iter_mbox_spans(path)
+
+
+# ---------- Per-message triage (worker processes) ----------
+
+def _init_worker(my_addr: str, model_path: str = "", min_confidence: float = 0.8):
+    global _my_addr, _model, _min_confidence
+    _my_addr = my_addr
+    _model = load_model(model_path)  # memory-mapped weights: cheap per worker
+    _min_confidence = min_confidence
+
+
+def _read_raw(path: str, start: int, end: int) -> bytes:
+    if end == -1:
+        with open(path, "rb") as f:
+            return f.read()
+    mm = _maps.get(path)
+    if mm is None:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _maps[path] = mm
+    return mm[start:end]
+
+
+def _header(msg, name: str) -> str:
+    value = msg.get(name)
+    if value is None:
+        return ""
+    try:
+        return str(make_header(decode_header(str(value))))
+    except (LookupError, UnicodeError, ValueError):
+        return str(value)
+
+
+def _decode_part(part) -> str:
+    payload = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        # Unknown charset name
+        return payload.decode("utf-8", errors="replace")
+
+
+def _body_text(msg) -> str:
+    # Prefer text/plain, fall back to HTML; attachments are skipped
+    html_part = None
+    for part in msg.walk():
+        if part.is_multipart() or part.get_filename():
+            continue
+        ctype = part.get_content_type()
+        if ctype == "text/plain":
+            return _decode_part(part).strip()
+        if ctype == "text/html" and html_part is None:
+            html_part = part
+    if html_part is not None:
+        return html_to_text(_decode_part(html_part))
+    return ""
+
+
+def triage(job) -> dict:
+    path, start, end = job
+    source = path if end == -1 else f"{path}@{start}"
+    try:
+        msg = _parser.parsebytes(_read_raw(path, start, end))
+
+        sender = _header(msg, "From")
+        subject = _header(msg, "Subject")
+        body = _body_text(msg)
+        headers = {k.lower(): str(v) for k, v in msg.items()}
+        sender_email = parseaddr(sender)[1].lower()
+
+        list_mail = is_list_mail(headers)
+        human_sender = (
+            (not _my_addr or sender_email != _my_addr)
+            and (not is_bulk_sender(sender))
+            and (not list_mail)
+            and (not is_auto_submitted(headers))
+            and infer_human_sender(sender, subject, body)
+        )
+
+        # No thread context offline, so rule 1 (reply to you) can't fire here
+        result = classify(ClassifyEmailRequest(
+            sender=sender,
+            subject=subject,
+            body=body,
+            human_sender=human_sender,
+            is_newsletter=list_mail,
+        ))
+    except Exception as e:
+        return {"source": source, "error": f"{type(e).__name__}: {e}"}
+
+    return {
+        "date": _header(msg, "Date"),
+        "message_id": _header(msg, "Message-ID"),
+        "sender": sender,
+        "subject": subject,
+        "priority_level": result.priority_level,
+        "folder": result.folder,
+        "notify": result.notify,
+        "reason": result.reason,
+        "human_sender": human_sender,
+        "is_newsletter": list_mail,
+        "body_preview": body[:BODY_CHARS],  # training text for learned.py
+        "learned_level": "",
+        "learned_confidence": "",
+        "my_override": "",
+        "source": source,
+        "error": "",
+    }
+
+
+def _score_learned(rows: list[dict]):
+    # One featurize + one vectorized scoring call for the whole chunk
+    todo = [r for r in rows if not r.get("error") and r["priority_level"] in LEARNED_LEVELS]
+    if _model is None or not todo:
+        return
+    probs = _model.predict_proba([(r["sender"], r["subject"], r["body_preview"]) for r in todo])
+    best = probs.argmax(axis=1)
+    for r, p, i in zip(todo, probs, best):
+        pick = learned_pick(_model.labels[i], float(p[i]), _min_confidence)
+        if pick is not None:
+            r["learned_level"], r["learned_confidence"] = pick[0], round(pick[1], 4)
+
+
+def triage_chunk(jobs: list) -> list[dict]:
+    rows = [triage(job) for job in jobs]
+    _score_learned(rows)
+    return rows
+
+
+# ---------- Output ----------
+
+class RowWriter:
+    def __init__(self, path: str):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.jsonl = path.lower().endswith(".jsonl")
+        if not self.jsonl:
+            self.csv = csv.DictWriter(self.f, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write_rows(self, rows: list[dict]):
+        if self.jsonl:
+            self.f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows))
+        else:
+            self.csv.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+
+def ingest(paths: list[str], out_path: str, workers: int, my_addr: str = "",
+           model_path: str = "", min_confidence: float = 0.8) -> dict:
+    writer = RowWriter(out_path)
+    counts = {"messages": 0, "errors": 0}
+    buffer = []
+    started = time.perf_counter()
+
+    def collect(rows: list[dict]):
+        counts["messages"] += len(rows)
+        counts["errors"] += sum(1 for r in rows if r.get("error"))
+        buffer.extend(rows)
+        if len(buffer) >= WRITE_BATCH:
+            writer.write_rows(buffer)
+            buffer.clear()
+            print(f"  {counts['messages']:,} messages...", flush=True)
+
+    # Explicit bounded feeding: the parent submits chunks itself and waits on the
+    # oldest one when the window is full. Nothing blocks inside the Pool's own
+    # threads, so Ctrl-C / errors reach Pool.__exit__ -> terminate() cleanly.
+    try:
+        with Pool(workers, initializer=_init_worker, initargs=(my_addr.lower(), model_path, min_confidence)) as pool:
+            pending = deque()
+            for chunk in iter_chunks(iter_jobs(paths)):
+                pending.append(pool.apply_async(triage_chunk, (chunk,)))
+                if len(pending) >= workers * INFLIGHT_PER_WORKER:
+                    collect(pending.popleft().get())
+            while pending:
+                collect(pending.popleft().get())
+        if buffer:
+            writer.write_rows(buffer)
+    finally:
+        writer.close()
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    counts["per_second"] = round(counts["messages"] / counts["seconds"], 1) if counts["seconds"] else 0.0
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Triage .mbox files / .eml directories offline into a decision log.")
+    ap.add_argument("paths", nargs="+", help=".mbox files, .eml files, or directories of .eml files")
+    ap.add_argument("-o", "--output", required=True, help="output file (.csv or .jsonl)")
+    ap.add_argument("--workers", type=int, default=cpu_count(), help="worker processes (default: all cores)")
+    ap.add_argument("--me", default="", help="your address; your own messages are never marked human_sender")
+    ap.add_argument("--model", default=os.getenv("LEARNED_MODEL_PATH", ""), help="learned.py model prefix (optional)")
+    ap.add_argument("--min-confidence", type=float, default=float(os.getenv("LEARNED_MIN_CONFIDENCE", "0.8")))
+    args = ap.parse_args()
+
+    print(f"=== Archive ingest: {len(args.paths)} input(s), {args.workers} workers ===")
+    counts = ingest(args.paths, args.output, args.workers, args.me, args.model, args.min_confidence)
+    print(f"Done: {counts['messages']:,} messages ({counts['errors']:,} errors) in {counts['seconds']}s "
+          f"-> {counts['per_second']:,} msg/s. Output: {args.output}")
+
+if __name__ == "__main__":
+    main()
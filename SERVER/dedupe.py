@@ -0,0 +1,175 @@
+import hashlib
+import re
+from collections import OrderedDict
+
+from ladder import body_flags, subject_flags
+
+# SimHash near-duplicate detection for newsletters / promo blasts.
+# Campaigns send the same body over and over with tiny per-recipient
+# differences (greeting name, tracking ids), so an exact hash never matches.
+# A 64-bit SimHash flips only a few bits for those edits, and we look it up
+# in a small index of recent fingerprints.
+
+FINGERPRINT_BITS = 64
+BANDS = 8  # 8 bands x 8 bits: any fingerprint within 7 bits shares a band (pigeonhole)
+BAND_BITS = FINGERPRINT_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+DEFAULT_MAX_DISTANCE = 6
+DEFAULT_CAPACITY = 5000
+
+_TOKEN_RE = re.compile(r"[a-z0-9%$]+")
+
+
+def _tokens(text: str) -> list[str]:
+    tokens = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        # Drop per-recipient tracking ids / long numbers; they're noise for dedupe
+        if len(tok) > 12 and any(c.isdigit() for c in tok):
+            continue
+        tokens.append(tok)
+    return tokens
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> int:
+    tokens = _tokens(text)
+    # Word bigrams keep some ordering; single tokens cover very short bodies
+    features = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])] or tokens
+    if not features:
+        return 0
+
+    counts = [0] * FINGERPRINT_BITS
+    for feature in features:
+        h = _hash64(feature)
+        for bit in range(FINGERPRINT_BITS):
+            if h >> bit & 1:
+                counts[bit] += 1
+            else:
+                counts[bit] -= 1
+
+    fp = 0
+    for bit, c in enumerate(counts):
+        if c > 0:
+            fp |= 1 << bit
+    return fp
+
+
+def email_fingerprint(sender: str, subject: str, body: str) -> int:
+    # body is visible text (html_text.visible_text for HTML), so a shared <style>
+    # block or template markup can't make two different campaigns look alike.
+    # Sender domain is part of the text so two brands with the same template don't collide
+    domain = (sender or "").lower().rsplit("@", 1)[-1].strip(" >")
+    return simhash(f"{domain} {subject or ''} {body or ''}")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(fp: int) -> list[int]:
+    return [(fp >> (i * BAND_BITS)) & BAND_MASK for i in range(BANDS)]
+
+
+def decision_hints(req, body: str, extra=()) -> tuple:
+    """
+    Everything the ladder branches on that the body SimHash doesn't pin down:
+    caller hints plus sender/subject- and body-derived flags (and e.g. the learned
+    level via `extra`). A cached decision is only reused when these match exactly.
+    """
+    return (
+        req.is_reply_to_user, req.known_contact, req.human_sender,
+        req.is_transactional, req.is_newsletter,
+        *subject_flags(req.sender, req.subject),
+        *body_flags(body),
+        *extra,
+    )
+
+
+class FingerprintIndex:
+    """
+    Bounded LRU index of (fingerprint, hints) -> cached decision.
+    Also tracks hit rate and an estimate of time saved: each accepted reuse is
+    credited with the average cost of a cacheable miss (the parse and classify
+    work a hit skips; never reply drafting, which a hit can't skip).
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_distance: int = DEFAULT_MAX_DISTANCE):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be < {BANDS} for banded lookup")
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self._entries: OrderedDict[tuple[int, tuple], dict] = OrderedDict()
+        self._bands: list[dict[int, set[tuple[int, tuple]]]] = [{} for _ in range(BANDS)]
+
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+        self.timed_misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, fp: int, hints: tuple) -> dict | None:
+        # Only entries with identical hints are candidates, so a rejected near-match
+        # counts as a miss and isn't promoted in the LRU.
+        candidates = set()
+        for i, band in enumerate(_bands(fp)):
+            candidates |= self._bands[i].get(band, set())
+
+        best = None
+        best_dist = self.max_distance + 1
+        for key in candidates:
+            if key[1] != hints:
+                continue
+            dist = hamming(fp, key[0])
+            if dist < best_dist:
+                best, best_dist = key, dist
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(best)
+        return self._entries[best]
+
+    def add(self, fp: int, hints: tuple, decision: dict):
+        key = (fp, hints)
+        if key in self._entries:
+            self._entries[key] = decision
+            self._entries.move_to_end(key)
+            return
+
+        self._entries[key] = decision
+        for i, band in enumerate(_bands(fp)):
+            self._bands[i].setdefault(band, set()).add(key)
+
+        while len(self._entries) > self.capacity:
+            old, _ = self._entries.popitem(last=False)
+            for i, band in enumerate(_bands(old[0])):
+                bucket = self._bands[i].get(band)
+                if bucket is not None:
+                    bucket.discard(old)
+                    if not bucket:
+                        del self._bands[i][band]
+
+    def record_miss_cost(self, seconds: float):
+        self.miss_seconds += seconds
+        self.timed_misses += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        avg_miss = self.miss_seconds / self.timed_misses if self.timed_misses else 0.0
+        return {
+            "entries": len(self._entries),
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_miss_ms": round(avg_miss * 1000, 3),
+            "est_time_saved_ms": round(self.hits * avg_miss * 1000, 3),
+        }
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import requests
 import msal
@@ -7,8 +8,7 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from bs4 import BeautifulSoup
-import re
+from heuristics import is_auto_submitted, is_bulk_sender, is_list_mail
 
 GRAPH_BASE = "https://graph.microsoft.com/v1.0"
 LOCAL_CONCIERGE = "http://127.0.0.1:8000/concierge-email"
@@ -16,6 +16,16 @@ SCOPES = ["User.Read", "Mail.Read", "Mail.ReadWrite"]  # add Mail.Send later if
 
 TOKEN_CACHE_PATH = os.path.join(os.path.dirname(__file__), ".token_cache.bin")
 
+# Graph traffic for this run (calls + response bytes), printed at the end
+GRAPH_STATS = {"calls": 0, "bytes": 0}
+
+# Headers come with the list response so list/auto mail is known without a per-message call
+LIST_SELECT = "id,subject,from,receivedDateTime,bodyPreview,conversationId,internetMessageHeaders"
+
+def _count(r: requests.Response):
+    GRAPH_STATS["calls"] += 1
+    GRAPH_STATS["bytes"] += len(r.content or b"")
+
 def load_cache():
     cache = msal.SerializableTokenCache()
     if os.path.exists(TOKEN_CACHE_PATH):
@@ -54,6 +64,7 @@ def get_token(client_id: str, authority: str) -> str:
 def graph_get(token: str, url: str):
     headers = {"Authorization": f"Bearer {token}"}
     r = requests.get(url, headers=headers, timeout=60)
+    _count(r)
 
     if not r.ok:
         print("\n--- GRAPH REQUEST FAILED ---")
@@ -69,12 +80,14 @@ def graph_get(token: str, url: str):
 def graph_post(token: str, url: str, payload=None):
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     r = requests.post(url, headers=headers, json=payload, timeout=60)
+    _count(r)
     r.raise_for_status()
     return r.json() if r.text else {}
 
 def graph_patch(token: str, url: str, payload):
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     r = requests.patch(url, headers=headers, json=payload, timeout=60)
+    _count(r)
     r.raise_for_status()
     return r.json() if r.text else {}
 
@@ -95,55 +108,6 @@ def debug_token_claims(access_token: str):
     print("tid:", claims.get("tid"))
     print("preferred_username:", claims.get("preferred_username"))
     print("--- END ---\n")
-def html_to_text(html: str) -> str:
-    if not html:
-        return ""
-
-    soup = BeautifulSoup(html, "lxml")
-
-    # Remove junk
-    for tag in soup(["script", "style", "img", "svg", "meta", "link"]):
-        tag.decompose()
-
-    text = soup.get_text("\n")
-
-    # Normalize whitespace
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = re.sub(r"[ \t]{2,}", " ", text)
-    return text.strip()
-def infer_human_sender(sender: str, subject: str, body: str) -> bool:
-    sender_l = (sender or "").lower()
-    subject_l = (subject or "").lower()
-    body_l = (body or "").lower()
-
-    # Strong non-human patterns
-    nonhuman_sender_markers = ["noreply", "no-reply", "donotreply", "do-not-reply", "mailer-daemon", "notification", "automated"]
-    if any(m in sender_l for m in nonhuman_sender_markers):
-        return False
-
-    # List/newsletter markers (these are big tells)
-    list_markers = ["unsubscribe", "view in browser", "manage preferences", "email preferences"]
-    if any(m in body_l for m in list_markers):
-        return False
-
-    # Transactional indicators
-    transactional_keywords = ["receipt", "invoice", "order", "confirmation", "transaction"]
-    if any(k in subject_l for k in transactional_keywords):
-        return False
-
-    # Human-ish cues: conversational tone / signoff
-    signoffs = ["thanks,", "thank you,", "sincerely,", "best,", "regards,", "talk to you", "see you", "peace,"]
-    if any(s in body_l for s in signoffs):
-        return True
-
-    # Personal email provider domains are often human (not perfect, but good)
-    personal_domains = ["gmail.com", "outlook.com", "hotmail.com", "icloud.com", "yahoo.com", "proton.me", "protonmail.com"]
-    if any(d in sender_l for d in personal_domains):
-        return True
-
-    # Default conservative: unknown
-    return False
-    
 def email_addr(email_obj: dict) -> str:
     # Handles Graph emailAddress object patterns safely
     if not email_obj:
@@ -156,10 +120,17 @@ def get_my_address(token: str) -> str:
     addr = (me.get("mail") or me.get("userPrincipalName") or "").lower().strip()
     return addr
 
-def is_bulk_sender(sender_str: str) -> bool:
-    s = (sender_str or "").lower()
-    markers = ["noreply", "no-reply", "donotreply", "do-not-reply", "mailer-daemon", "notification", "automated"]
-    return any(m in s for m in markers)
+def message_headers(msg: dict) -> dict:
+    # internetMessageHeaders is a list of {name, value}; only present when $select-ed (LIST_SELECT)
+    return {
+        (h.get("name") or "").lower(): (h.get("value") or "")
+        for h in (msg.get("internetMessageHeaders") or [])
+    }
+
+def post_concierge(payload: dict) -> dict:
+    r = requests.post(LOCAL_CONCIERGE, json=payload, timeout=90)
+    r.raise_for_status()
+    return r.json()
 
 def conversation_initiated_by_me(token: str, conversation_id: str, my_addr: str) -> bool:
     """
@@ -192,6 +163,96 @@ def conversation_initiated_by_me(token: str, conversation_id: str, my_addr: str)
 
     return False
 
+def fetch_body(token: str, msg_id: str) -> dict:
+    full = graph_get(token, f"{GRAPH_BASE}/me/messages/{msg_id}?$select=body")
+    return full.get("body", {}) or {}
+
+def classify_full_body(token: str, msg_id: str, base_payload: dict) -> dict:
+    """
+    Tier 2: download the full body and run the concierge on it. The raw HTML is
+    sent as-is; the server checks its near-duplicate cache first and only parses
+    (html_to_text) on a miss.
+    """
+    body = fetch_body(token, msg_id)
+    content = body.get("content", "")
+    if (body.get("contentType") or "").lower() == "html":
+        return post_concierge({**base_payload, "body_html": content})
+    return post_concierge({**base_payload, "body": content})
+
+def list_inbox(token: str, top: int = 10, select: str = LIST_SELECT) -> list:
+    inbox = graph_get(token, f"{GRAPH_BASE}/me/mailFolders/inbox/messages?$top={top}&$select={select}")
+    return inbox.get("value", [])
+
+def metadata_payload(token: str, msg: dict, my_addr: str) -> dict:
+    # Hints from the list response (incl. headers) + the conversation lookup; no body download
+    sender = (msg.get("from", {}) or {}).get("emailAddress", {}) or {}
+    sender_str = f"{sender.get('name','')} <{sender.get('address','')}>".strip()
+    headers = message_headers(msg)
+    list_mail = is_list_mail(headers)
+
+    initiated_by_me = conversation_initiated_by_me(token, msg.get("conversationId", ""), my_addr)
+
+    human_sender = (
+        (email_addr(sender) != my_addr)
+        and (not is_bulk_sender(sender_str))
+        and (not list_mail)
+        and (not is_auto_submitted(headers))
+    )
+
+    # minimal hints; heuristics will handle promo/transactional/newsletter
+    return {
+        "sender": sender_str,
+        "subject": msg.get("subject", ""),
+        "user_notes": "Draft a concise reply if needed. Do not send.",
+        "is_reply_to_user": bool(initiated_by_me),
+        "human_sender": human_sender,
+        "is_newsletter": list_mail,
+        "known_contact": False
+    }
+
+def concierge_message(token: str, msg: dict, base_payload: dict) -> tuple[dict, bool]:
+    """
+    Tier 1: classify from bodyPreview. The server flags needs_full_body when the
+    rest of the body could change the decision or a draft is needed; only then is
+    the body downloaded (tier 2). Returns (concierge output, body fetched?).
+    """
+    concierge = post_concierge({**base_payload, "body": msg.get("bodyPreview", ""), "body_truncated": True})
+    if not concierge.get("needs_full_body"):
+        return concierge, False
+    return classify_full_body(token, msg["id"], base_payload), True
+
+def measure(token: str, my_addr: str, top: int):
+    """
+    Before/after Graph traffic for the latest `top` inbox messages (server must be running).
+    Before = the original flow: list, then per message a full-message GET + conversation lookup.
+    After  = list with headers, then per message the conversation lookup + the body only on tier 2.
+    The /me calls are the same in both flows and are left out.
+    """
+    def traffic(fn, *args):
+        calls, size = GRAPH_STATS["calls"], GRAPH_STATS["bytes"]
+        result = fn(*args)
+        return result, GRAPH_STATS["calls"] - calls, GRAPH_STATS["bytes"] - size
+
+    _, before_calls, before_bytes = traffic(list_inbox, token, top, "id,subject,from,receivedDateTime,bodyPreview,conversationId")
+    msgs, after_calls, after_bytes = traffic(list_inbox, token, top)
+    bodies = 0
+    for m in msgs:
+        _, calls, size = traffic(graph_get, token, f"{GRAPH_BASE}/me/messages/{m['id']}?$select=subject,from,body,conversationId")
+        before_calls, before_bytes = before_calls + calls, before_bytes + size
+
+        base_payload, calls, size = traffic(metadata_payload, token, m, my_addr)
+        before_calls, before_bytes = before_calls + calls, before_bytes + size
+        after_calls, after_bytes = after_calls + calls, after_bytes + size
+
+        (_, fetched), calls, size = traffic(concierge_message, token, m, base_payload)
+        after_calls, after_bytes = after_calls + calls, after_bytes + size
+        bodies += fetched
+
+    print(f"\n=== Graph traffic for {len(msgs)} messages (before -> after) ===")
+    print(f"Calls: {before_calls} -> {after_calls}")
+    print(f"Bytes: {before_bytes:,} -> {after_bytes:,}")
+    print(f"Full bodies fetched: {len(msgs)} -> {bodies}")
+
 def main():
     # 1) Fill these in once after app registration
     CLIENT_ID = os.getenv("MS_CLIENT_ID")
@@ -210,15 +271,14 @@ def main():
     profile = graph_get(token, f"{GRAPH_BASE}/me?$select=displayName,userPrincipalName,id")
     print("ME:", profile)
     
-    # 2) List latest inbox messages
-    inbox = graph_get(
-        token,
-        f"{GRAPH_BASE}/me/mailFolders/inbox/messages"
-        "?$top=10"
-        "&$select=id,subject,from,receivedDateTime,bodyPreview,conversationId"
-    )
+    if "--measure" in sys.argv:
+        # python graph_thintegration.py --measure [N]: before/after traffic report; nothing is written to Outlook
+        args = sys.argv[sys.argv.index("--measure") + 1:]
+        measure(token, my_addr, int(args[0]) if args else 25)
+        return
 
-    msgs = inbox.get("value", [])
+    # 2) List latest inbox messages (headers included, see LIST_SELECT)
+    msgs = list_inbox(token)
     if not msgs:
         print("No messages found.")
         return
@@ -234,54 +294,25 @@ def main():
     choice = int(input("Pick a message number to concierge: ").strip())
     picked = msgs[choice - 1]
     msg_id = picked["id"]
-    conv_id = picked.get("conversationId", "")
-
-    # 3) Fetch full body
-    full = graph_get(
-        token,
-        f"{GRAPH_BASE}/me/messages/{msg_id}?$select=subject,from,body,conversationId"
-    )
-    sender = (full.get("from", {}) or {}).get("emailAddress", {}) or {}
-    sender_str = f"{sender.get('name','')} <{sender.get('address','')}>".strip()
-    subject = full.get("subject", "")
-    body_html = (full.get("body", {}) or {}).get("content", "")
-    body_text = html_to_text(body_html)
-    human_sender = infer_human_sender(sender_str, subject, body_text)
-    print("Inferred human_sender =", human_sender)
-    conv_id = full.get("conversationId") or conv_id
-
-    sender_obj = (full.get("from", {}) or {}).get("emailAddress", {}) or {}
-    sender_email = email_addr(sender_obj)
 
-    initiated_by_me = conversation_initiated_by_me(token, conv_id, my_addr)
-    is_reply_to_user = bool(initiated_by_me)
+    # 3) Metadata first: hints come from the list response (no per-message header/body call)
+    base_payload = metadata_payload(token, picked, my_addr)
+    print("Metadata hints -> initiated_by_me:", base_payload["is_reply_to_user"],
+          "| human_sender:", base_payload["human_sender"], "| list_mail:", base_payload["is_newsletter"])
 
-    human_sender = (sender_email != my_addr) and (not is_bulk_sender(sender_str))
+    # 4) Tier 1 from bodyPreview; tier 2 (full body) only when the server asks for it
+    concierge, fetched = concierge_message(token, picked, base_payload)
+    if not fetched:
+        print("Decided from metadata; full body not fetched.")
 
-    print("Metadata hints -> initiated_by_me:", initiated_by_me, "| human_sender:", human_sender)
-    
-    # 4) Call your local concierge engine
-    payload = {
-        "sender": sender_str,
-        "subject": subject,
-        "body": body_text,
-        "user_notes": "Draft a concise reply if needed. Do not send.",
-         "is_reply_to_user": is_reply_to_user,
-        "human_sender": human_sender,
-        "known_contact": False
-    }
-        
-        # minimal hints; heuristics will handle promo/transactional/newsletter
-    
-    r = requests.post(LOCAL_CONCIERGE, json=payload, timeout=90)
-    r.raise_for_status()
-    concierge = r.json()
+    print(f"Graph usage: {GRAPH_STATS['calls']} calls, {GRAPH_STATS['bytes']:,} bytes")
 
     print("\n=== QUICK VIEW ===")
     print("Priority:", concierge.get("priority_level"))
     print("Folder:", concierge.get("folder"))
     print("Notify:", concierge.get("notify"))
     print("Reply recommended:", concierge.get("reply_recommended"))
+    print("Near-duplicate (cached):", concierge.get("near_duplicate"))
     print("Reason:", concierge.get("reason"))
     print("\n=== Concierge Output ===")
     print(json.dumps(concierge, indent=2))
@@ -0,0 +1,56 @@
+# Sender / header heuristics shared by graph_thintegration.py and archive_ingest.py.
+# Plain functions with no client setup, so the offline tool can import them
+# without msal/requests or a .env.
+
+
+def infer_human_sender(sender: str, subject: str, body: str) -> bool:
+    sender_l = (sender or "").lower()
+    subject_l = (subject or "").lower()
+    body_l = (body or "").lower()
+
+    # Strong non-human patterns
+    nonhuman_sender_markers = ["noreply", "no-reply", "donotreply", "do-not-reply", "mailer-daemon", "notification", "automated"]
+    if any(m in sender_l for m in nonhuman_sender_markers):
+        return False
+
+    # List/newsletter markers (these are big tells)
+    list_markers = ["unsubscribe", "view in browser", "manage preferences", "email preferences"]
+    if any(m in body_l for m in list_markers):
+        return False
+
+    # Transactional indicators
+    transactional_keywords = ["receipt", "invoice", "order", "confirmation", "transaction"]
+    if any(k in subject_l for k in transactional_keywords):
+        return False
+
+    # Human-ish cues: conversational tone / signoff
+    signoffs = ["thanks,", "thank you,", "sincerely,", "best,", "regards,", "talk to you", "see you", "peace,"]
+    if any(s in body_l for s in signoffs):
+        return True
+
+    # Personal email provider domains are often human (not perfect, but good)
+    personal_domains = ["gmail.com", "outlook.com", "hotmail.com", "icloud.com", "yahoo.com", "proton.me", "protonmail.com"]
+    if any(d in sender_l for d in personal_domains):
+        return True
+
+    # Default conservative: unknown
+    return False
+
+
+def is_bulk_sender(sender_str: str) -> bool:
+    s = (sender_str or "").lower()
+    markers = ["noreply", "no-reply", "donotreply", "do-not-reply", "mailer-daemon", "notification", "automated"]
+    return any(m in s for m in markers)
+
+
+def is_list_mail(headers: dict) -> bool:
+    # Mailing list / bulk markers (RFC 2369 List-*, Precedence)
+    if "list-unsubscribe" in headers or "list-id" in headers:
+        return True
+    return headers.get("precedence", "").strip().lower() in ("bulk", "list", "junk")
+
+
+def is_auto_submitted(headers: dict) -> bool:
+    # RFC 3834: anything other than "no" is machine-generated
+    value = headers.get("auto-submitted", "").strip().lower()
+    return bool(value) and value != "no"
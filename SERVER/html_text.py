@@ -0,0 +1,36 @@
+import re
+from html import unescape
+
+from bs4 import BeautifulSoup
+
+# Non-rendered blocks: <head> (title/meta/style), <style>, <script>, and comments
+# (email templates hide Outlook-only CSS in conditional comments)
+_INVISIBLE_RE = re.compile(r"<(head|style|script)\b.*?</\1\s*>|<!--.*?-->", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def html_to_text(html: str) -> str:
+    if not html:
+        return ""
+
+    soup = BeautifulSoup(html, "lxml")
+
+    # Remove junk
+    for tag in soup(["script", "style", "img", "svg", "meta", "link"]):
+        tag.decompose()
+
+    text = soup.get_text("\n")
+
+    # Normalize whitespace
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    return text.strip()
+
+
+def visible_text(html: str) -> str:
+    # Cheap regex version of html_to_text (no parser) for the dedupe hot path:
+    # drops non-rendered blocks and tags, decodes entities
+    if not html:
+        return ""
+    text = _INVISIBLE_RE.sub(" ", html)
+    return unescape(_TAG_RE.sub(" ", text))
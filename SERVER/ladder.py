@@ -0,0 +1,147 @@
+from schemas import ClassifyEmailRequest, ClassifyEmailResponse
+
+# The priority ladder, kept free of app/client setup so offline tools
+# (archive_ingest.py) can import it without an API key or a FastAPI app.
+
+
+# Promo detection (v0.7) — if it's marketing/sales, prefer Ignore over Batch
+PROMO_KEYWORDS = [
+    "sale", "deal", "promo", "promotion", "limited time", "offer", "save ",
+    "discount", "% off", "clearance", "free shipping", "ends today", "last chance",
+    "exclusive", "coupon", "buy now", "shop now", "today only", "flash sale"
+]
+TRANSACTIONAL_KEYWORDS = ["receipt", "invoice", "order", "confirmation", "transaction"]
+NEWSLETTER_MARKERS = ["unsubscribe", "view in browser"]
+
+
+# The only levels the learned stage may pick (rules 4 and 5)
+LEARNED_LEVELS = ("BATCH FOR LATER", "IGNORE / AUTO-ARCHIVE")
+
+
+def learned_pick(level: str, confidence: float, min_confidence: float) -> tuple[str, float] | None:
+    # Shared threshold logic for the server (per email) and archive_ingest (per chunk)
+    if level not in LEARNED_LEVELS or confidence < min_confidence:
+        return None
+    return level, confidence
+
+
+def subject_flags(sender: str, subject: str) -> list[bool]:
+    # Ladder inputs that come from the sender/subject alone: [promo, transactional, no-reply].
+    # dedupe.decision_hints keys cached decisions on these, since a near-duplicate
+    # body can still arrive with a subject that lands on a different rule.
+    sender_lower = (sender or "").lower()
+    subject_lower = (subject or "").lower()
+    return [
+        any(k in subject_lower for k in PROMO_KEYWORDS),
+        any(word in subject_lower for word in TRANSACTIONAL_KEYWORDS),
+        "no-reply" in sender_lower or "noreply" in sender_lower,
+    ]
+
+
+def body_flags(body: str) -> list[bool]:
+    # Ladder inputs that come from the body text: [promo, newsletter marker].
+    # Also part of the dedupe key: one added "20% off" line barely moves the SimHash.
+    body_lower = (body or "").lower()
+    return [
+        any(k in body_lower for k in PROMO_KEYWORDS),
+        any(m in body_lower for m in NEWSLETTER_MARKERS),
+    ]
+
+
+def classify(req: ClassifyEmailRequest, learned=None) -> ClassifyEmailResponse:
+    """
+    Deterministic ladder (rules 1-5). `learned` is an optional callable
+    req -> (level, confidence) | None that may pick between rules 4 and 5.
+    """
+    promo_subject, transactional_subject, noreply_sender = subject_flags(req.sender, req.subject)
+    promo_body, newsletter_body = body_flags(req.body)
+
+    is_promo = promo_subject or promo_body
+
+       # Auto-detect newsletter-like emails
+    if not req.is_newsletter:
+        if newsletter_body:
+            req.is_newsletter = True
+
+    # If it looks like promo/marketing, treat it as "ignore" rather than "batch"
+    # We implement this by flipping newsletter off and letting default fall to Ignore,
+    # unless another higher-priority rule applies.
+    if req.is_newsletter and is_promo and not req.known_contact and not req.is_reply_to_user:
+        req.is_newsletter = False
+
+
+    # Auto-detect transactional
+    if not req.is_transactional:
+        if transactional_subject:
+            req.is_transactional = True
+
+    # Auto-detect newsletter-like sender patterns (but don't batch obvious promos)
+    if noreply_sender:
+        if not req.known_contact and not is_promo:
+            req.is_newsletter = True
+
+
+    # With only a preview, rules 4/5 could still change from body text we haven't seen
+    # (promo keywords, "unsubscribe"). A promo hit in the preview is already final.
+    needs_full_body = req.body_truncated and not is_promo
+
+    # 1) INTERRUPT NOW
+    if req.is_reply_to_user:
+        return ClassifyEmailResponse(
+            priority_level="INTERRUPT NOW",
+            folder="1 - Action Now",
+            notify=True,
+            reason="Reply to a conversation you initiated."
+        )
+
+    # 2) NOTIFY (NON-URGENT)
+    if req.known_contact or req.human_sender:
+
+        return ClassifyEmailResponse(
+            priority_level="NOTIFY (NON-URGENT)",
+            folder="2 - Notify Later",
+            notify=True,
+            reason="Human message from a known contact."
+        )
+
+    # 3) LOG SILENTLY
+    if req.is_transactional:
+        return ClassifyEmailResponse(
+            priority_level="LOG SILENTLY",
+            folder="3 - Log Only",
+            notify=False,
+            reason="Transactional/receipt email: keep for records, no interruption."
+        )
+
+    # Learned stage (optional): a confident model trained on your overrides
+    # decides between rules 4 and 5. Rules 1-3 above always win.
+    learned_reason = None
+    choice = None
+    if learned is not None and req.body_truncated:
+        # The model scores body text; a preview can score differently than the full body
+        needs_full_body = True
+    elif learned is not None:
+        choice = learned(req)
+    if choice is not None:
+        level, confidence = choice
+        req.is_newsletter = level == "BATCH FOR LATER"
+        learned_reason = f"Learned from your past decisions and overrides (confidence {confidence:.0%})."
+
+    # 4) BATCH FOR LATER
+    if req.is_newsletter:
+        return ClassifyEmailResponse(
+            priority_level="BATCH FOR LATER",
+            folder="4 - Batch Read",
+            notify=False,
+            reason=learned_reason or "Newsletter/brief: review during batch window.",
+            needs_full_body=needs_full_body,
+        )
+
+    # 5) IGNORE / AUTO-ARCHIVE
+    return ClassifyEmailResponse(
+        priority_level="IGNORE / AUTO-ARCHIVE",
+        folder="5 - Ignore (Promo)",
+        notify=False,
+        reason=learned_reason or "Default classification: promotional/low-value or unknown importance.",
+        needs_full_body=needs_full_body,
+    )
@@ -0,0 +1,258 @@
+"""
+Optional learned stage: hashed bag-of-words + linear (softmax) model trained
+on logged decisions and "My Override" corrections (see SCHEMA.md).
+
+It never replaces the ladder; the server (main._classify) and archive_ingest
+only consult it for rules 4/5 (Batch vs Ignore) and only when confident. NumPy is optional: without it,
+load_model() returns None and the ladder runs as before.
+
+Weights are a plain .npy (float32, n_features x n_labels) loaded with
+mmap_mode="r", so startup is instant and only touched rows are paged in.
+
+Usage:
+    python learned.py train decisions.csv [more.csv ...] -o models/concierge
+    python learned.py bench models/concierge --n 10000
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+LABELS = [
+    "INTERRUPT NOW",
+    "NOTIFY (NON-URGENT)",
+    "LOG SILENTLY",
+    "BATCH FOR LATER",
+    "IGNORE / AUTO-ARCHIVE",
+]
+
+N_FEATURES = 2 ** 18  # slot 0 is the bias feature
+BODY_CHARS = 500      # only the start of the body is used (matches archive_ingest's body_preview)
+OVERRIDE_WEIGHT = 5.0  # a correction you made counts more than a logged ladder decision
+
+_TOKEN_RE = re.compile(r"[a-z0-9%$]+")
+
+
+def _slot(feature: str) -> int:
+    # crc32 is stable across processes (unlike hash()), so weights stay valid.
+    # No memo: a bare crc32 is ~40 ns slower per call than a dict hit and needs no memory.
+    return zlib.crc32(feature.encode("utf-8")) % (N_FEATURES - 1) + 1
+
+
+def _features(sender: str, subject: str, body: str) -> set[int]:
+    sender_l = (sender or "").lower()
+    domain = sender_l.rsplit("@", 1)[-1].strip(" >")
+    slots = {0, _slot("d:" + domain)}
+    slots.update(_slot("f:" + t) for t in _TOKEN_RE.findall(sender_l))
+    slots.update(_slot("s:" + t) for t in _TOKEN_RE.findall((subject or "").lower()))
+    slots.update(_slot("b:" + t) for t in _TOKEN_RE.findall((body or "")[:BODY_CHARS].lower()))
+    return slots
+
+
+def featurize(rows):
+    """
+    rows: iterable of (sender, subject, body).
+    Returns a CSR-style batch (indices, values, indptr); every row is non-empty
+    because of the bias slot, which np.add.reduceat relies on.
+    """
+    indices = []
+    indptr = [0]
+    for sender, subject, body in rows:
+        slots = _features(sender, subject, body)
+        indices.extend(slots)
+        indptr.append(len(indices))
+
+    indices = np.asarray(indices, dtype=np.int64)
+    indptr = np.asarray(indptr, dtype=np.int64)
+    nnz = np.diff(indptr)
+    # Binary features, L2-normalized per row so long bodies don't dominate
+    values = np.repeat(1.0 / np.sqrt(nnz), nnz).astype(np.float32)
+    return indices, values, indptr
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+class LinearModel:
+    def __init__(self, weights, labels: list[str]):
+        self.weights = weights  # (N_FEATURES, len(labels)), possibly a read-only memmap
+        self.labels = labels
+
+    def predict_proba_csr(self, indices, values, indptr):
+        # One gather + one segmented sum for the whole batch
+        contrib = self.weights[indices] * values[:, None]
+        logits = np.add.reduceat(contrib, indptr[:-1], axis=0)
+        return _softmax(logits)
+
+    def predict_proba(self, rows):
+        return self.predict_proba_csr(*featurize(rows))
+
+    def predict(self, rows) -> list[tuple[str, float]]:
+        probs = self.predict_proba(rows)
+        best = probs.argmax(axis=1)
+        return [(self.labels[i], float(probs[r, i])) for r, i in enumerate(best)]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.save(path + ".npy", np.asarray(self.weights, dtype=np.float32))
+        with open(path + ".json", "w") as f:
+            json.dump({"labels": self.labels, "n_features": N_FEATURES, "body_chars": BODY_CHARS}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearModel":
+        with open(path + ".json", "r") as f:
+            meta = json.load(f)
+        if meta.get("n_features") != N_FEATURES:
+            raise ValueError(f"Model {path} was trained with n_features={meta.get('n_features')}, expected {N_FEATURES}")
+        weights = np.load(path + ".npy", mmap_mode="r")
+        return cls(weights, meta["labels"])
+
+
+def load_model(path: str) -> LinearModel | None:
+    # Quietly disabled when unset, missing, or NumPy isn't installed
+    if not path or np is None or not os.path.exists(path + ".npy"):
+        return None
+    return LinearModel.load(path)
+
+
+# ---------- Training ----------
+
+# Explicit vocabulary for "My Override": ladder levels, folder names and short forms.
+# Anything else (e.g. SCHEMA.md urgency values like "Low"/"High") is ambiguous.
+LABEL_ALIASES = {
+    "INTERRUPT NOW": ["INTERRUPT", "ACTION NOW", "1 - ACTION NOW"],
+    "NOTIFY (NON-URGENT)": ["NOTIFY", "NON-URGENT", "NOTIFY LATER", "2 - NOTIFY LATER"],
+    "LOG SILENTLY": ["LOG", "LOG ONLY", "3 - LOG ONLY"],
+    "BATCH FOR LATER": ["BATCH", "BATCH READ", "4 - BATCH READ"],
+    "IGNORE / AUTO-ARCHIVE": ["IGNORE", "AUTO-ARCHIVE", "ARCHIVE", "IGNORE (PROMO)", "5 - IGNORE (PROMO)"],
+}
+_ALIAS_TO_LABEL = {
+    alias: label for label, aliases in LABEL_ALIASES.items() for alias in [label, *aliases]
+}
+
+
+def normalize_label(value: str) -> str | None:
+    return _ALIAS_TO_LABEL.get(" ".join((value or "").upper().split()))
+
+
+def read_decisions(paths: list[str], skipped: dict | None = None):
+    """
+    Reads archive_ingest output (.csv / .jsonl). The target is My Override when
+    filled in, otherwise the logged ladder priority_level (never learned_level,
+    so the model doesn't train on its own picks). Rows whose override isn't
+    recognized are skipped, not trained on the ladder label the user corrected;
+    `skipped` collects those values with counts.
+    Yields ((sender, subject, body), label, weight).
+    """
+    for path in paths:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            rows = (json.loads(line) for line in f if line.strip()) if path.lower().endswith(".jsonl") else csv.DictReader(f)
+            for row in rows:
+                if row.get("error"):
+                    continue
+                raw_override = (row.get("my_override") or "").strip()
+                override = normalize_label(raw_override)
+                if raw_override and override is None:
+                    if skipped is not None:
+                        skipped[raw_override] = skipped.get(raw_override, 0) + 1
+                    continue
+                label = override or normalize_label(row.get("priority_level", ""))
+                if label is None:
+                    continue
+                text = (row.get("sender", ""), row.get("subject", ""), row.get("body_preview", ""))
+                yield text, label, OVERRIDE_WEIGHT if override else 1.0
+
+
+def train(rows, labels: list[str], sample_weight=None, epochs: int = 60, lr: float = 0.5, l2: float = 1e-6) -> LinearModel:
+    # Full-batch softmax regression with Adagrad (sparse hashed features learn at their own pace)
+    indices, values, indptr = featurize(rows)
+    n, k = len(labels), len(LABELS)
+    y = np.zeros((n, k), dtype=np.float32)
+    y[np.arange(n), [LABELS.index(label) for label in labels]] = 1.0
+    w = np.ones(n, dtype=np.float32) if sample_weight is None else np.asarray(sample_weight, dtype=np.float32)
+    w = w / w.sum()
+
+    row_of = np.repeat(np.arange(n), np.diff(indptr))
+    weights = np.zeros((N_FEATURES, k), dtype=np.float32)
+    grad_sq = np.full((N_FEATURES, k), 1e-8, dtype=np.float32)
+    model = LinearModel(weights, list(LABELS))
+
+    for _ in range(epochs):
+        probs = model.predict_proba_csr(indices, values, indptr)
+        err = (probs - y) * w[:, None]
+        contrib = err[row_of] * values[:, None]
+        grad = np.zeros_like(weights)
+        for c in range(k):
+            grad[:, c] = np.bincount(indices, weights=contrib[:, c], minlength=N_FEATURES)
+        grad += l2 * weights
+        grad_sq += grad * grad
+        weights -= lr * grad / np.sqrt(grad_sq)
+
+    return model
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Train / benchmark the optional learned classifier.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    t = sub.add_parser("train", help="train from archive_ingest output (.csv/.jsonl) with My Override filled in")
+    t.add_argument("paths", nargs="+")
+    t.add_argument("-o", "--output", required=True, help="model path prefix (writes <prefix>.npy + <prefix>.json)")
+    t.add_argument("--epochs", type=int, default=60)
+
+    b = sub.add_parser("bench", help="time batch scoring of synthetic emails")
+    b.add_argument("model")
+    b.add_argument("--n", type=int, default=10_000)
+
+    args = ap.parse_args()
+    if np is None:
+        raise RuntimeError("NumPy is required for learned.py (pip install numpy).")
+
+    if args.cmd == "train":
+        skipped = {}
+        data = list(read_decisions(args.paths, skipped))
+        if skipped:
+            values = ", ".join(f"{v!r} x{n}" for v, n in sorted(skipped.items(), key=lambda kv: -kv[1])[:5])
+            print(f"Skipped {sum(skipped.values()):,} rows with unrecognized My Override values: {values}")
+        if not data:
+            raise RuntimeError("No labeled rows found.")
+        rows, labels, weights = zip(*data)
+        print(f"Training on {len(rows):,} rows ({sum(1 for x in weights if x > 1):,} overrides)...")
+        started = time.perf_counter()
+        model = train(rows, list(labels), weights, epochs=args.epochs)
+        model.save(args.output)
+
+        preds = [label for label, _ in model.predict(rows)]
+        acc = sum(p == label for p, label in zip(preds, labels)) / len(labels)
+        print(f"Saved {args.output}.npy in {time.perf_counter() - started:.1f}s (train accuracy {acc:.1%})")
+    else:
+        started = time.perf_counter()
+        model = LinearModel.load(args.model)
+        loaded = time.perf_counter()
+        rows = [
+            (f"Sender {i} <news{i % 97}@brand{i % 13}.com>", f"Weekly update #{i}: deals and news",
+             "Hi there, here is what's new this week. Save 20% on selected items. Unsubscribe | View in browser " * 3)
+            for i in range(args.n)
+        ]
+        t0 = time.perf_counter()
+        batch = featurize(rows)
+        t1 = time.perf_counter()
+        model.predict_proba_csr(*batch)
+        t2 = time.perf_counter()
+        print(f"load {1000 * (loaded - started):.1f} ms | featurize {1000 * (t1 - t0):.1f} ms | "
+              f"score {1000 * (t2 - t1):.1f} ms for {args.n:,} emails")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from openai import OpenAI
@@ -11,6 +13,10 @@ from schemas import (
     ConciergeEmailRequest,
     ConciergeEmailResponse,
 )
+from dedupe import FingerprintIndex, decision_hints, email_fingerprint
+from html_text import html_to_text, visible_text
+from learned import load_model
+from ladder import classify, learned_pick
 
 
 
@@ -21,6 +27,18 @@ app = FastAPI(title="AI Email Concierge Server", version="0.1.0")
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2")
 
+# Near-duplicate cache for newsletters/promo blasts (see dedupe.py)
+DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "1") != "0"
+dedupe_index = FingerprintIndex(
+    capacity=int(os.getenv("DEDUPE_CAPACITY", "5000")),
+    max_distance=int(os.getenv("DEDUPE_MAX_DISTANCE", "6")),
+)
+dedupe_lock = threading.Lock()  # sync endpoints run in a threadpool
+
+# Optional learned tie-breaker for rules 4/5 (see learned.py); None when not configured
+learned_model = load_model(os.getenv("LEARNED_MODEL_PATH", ""))
+LEARNED_MIN_CONFIDENCE = float(os.getenv("LEARNED_MIN_CONFIDENCE", "0.8"))
+
 SYSTEM_INSTRUCTIONS = """You are my AI email concierge.
 
 Draft reply requirements:
@@ -37,6 +55,11 @@ Draft reply requirements:
 def health():
     return {"ok": True}
 
+@app.get("/dedupe-stats")
+def dedupe_stats():
+    with dedupe_lock:
+        return {"enabled": DEDUPE_ENABLED, **dedupe_index.stats()}
+
 @app.post("/draft-reply", response_model=DraftReplyResponse)
 def draft_reply(req: DraftReplyRequest):
     api_key = os.getenv("OPENAI_API_KEY")
@@ -67,88 +90,16 @@ User notes (optional):
 @app.post("/classify-email", response_model=ClassifyEmailResponse)
 def classify_email(req: ClassifyEmailRequest):
     return _classify(req)
-def _classify(req: ClassifyEmailRequest) -> ClassifyEmailResponse:
-   
-    sender_lower = req.sender.lower()
-    subject_lower = req.subject.lower()
-    body_lower = req.body.lower()
-    # Promo detection (v0.7) — if it's marketing/sales, prefer Ignore over Batch
-    promo_keywords = [
-        "sale", "deal", "promo", "promotion", "limited time", "offer", "save ",
-        "discount", "% off", "clearance", "free shipping", "ends today", "last chance",
-        "exclusive", "coupon", "buy now", "shop now", "today only", "flash sale"
-    ]
-
-    is_promo = any(k in subject_lower for k in promo_keywords) or any(k in body_lower for k in promo_keywords)
-
-       # Auto-detect newsletter-like emails
-    if not req.is_newsletter:
-        if "unsubscribe" in body_lower or "view in browser" in body_lower:
-            req.is_newsletter = True
-
-    # If it looks like promo/marketing, treat it as "ignore" rather than "batch"
-    # We implement this by flipping newsletter off and letting default fall to Ignore,
-    # unless another higher-priority rule applies.
-    if req.is_newsletter and is_promo and not req.known_contact and not req.is_reply_to_user:
-        req.is_newsletter = False
-
-
-    # Auto-detect transactional
-    if not req.is_transactional:
-        transactional_keywords = ["receipt", "invoice", "order", "confirmation", "transaction"]
-        if any(word in subject_lower for word in transactional_keywords):
-            req.is_transactional = True
-
-    # Auto-detect newsletter-like sender patterns (but don't batch obvious promos)
-    if "no-reply" in sender_lower or "noreply" in sender_lower:
-        if not req.known_contact and not is_promo:
-            req.is_newsletter = True
-
-
-    # 1) INTERRUPT NOW
-    if req.is_reply_to_user:
-        return ClassifyEmailResponse(
-            priority_level="INTERRUPT NOW",
-            folder="1 - Action Now",
-            notify=True,
-            reason="Reply to a conversation you initiated."
-        )
-
-    # 2) NOTIFY (NON-URGENT)
-    if req.known_contact or req.human_sender:
-
-        return ClassifyEmailResponse(
-            priority_level="NOTIFY (NON-URGENT)",
-            folder="2 - Notify Later",
-            notify=True,
-            reason="Human message from a known contact."
-        )
-
-    # 3) LOG SILENTLY
-    if req.is_transactional:
-        return ClassifyEmailResponse(
-            priority_level="LOG SILENTLY",
-            folder="3 - Log Only",
-            notify=False,
-            reason="Transactional/receipt email: keep for records, no interruption."
-        )
+def _classify(req: ClassifyEmailRequest, learned=None) -> ClassifyEmailResponse:
+    # `learned` lets a caller that already scored the email pass its pick in
+    if learned_model is None:
+        return classify(req)
+    return classify(req, learned or (lambda r: _learned_level(r.sender, r.subject, r.body)))
 
-    # 4) BATCH FOR LATER
-    if req.is_newsletter:
-        return ClassifyEmailResponse(
-            priority_level="BATCH FOR LATER",
-            folder="4 - Batch Read",
-            notify=False,
-            reason="Newsletter/brief: review during batch window."
-        )
 
-    # 5) IGNORE / AUTO-ARCHIVE
-    return ClassifyEmailResponse(
-        priority_level="IGNORE / AUTO-ARCHIVE",
-        folder="5 - Ignore (Promo)",
-        notify=False,
-        reason="Default classification: promotional/low-value or unknown importance."
-    )
+def _learned_level(sender: str, subject: str, body: str) -> tuple[str, float] | None:
+    level, confidence = learned_model.predict([(sender, subject, body)])[0]
+    return learned_pick(level, confidence, LEARNED_MIN_CONFIDENCE)
 
 
 def _should_reply(classification: ClassifyEmailResponse, req: ConciergeEmailRequest) -> bool:
@@ -174,9 +125,38 @@ def _recommended_action(classification: ClassifyEmailResponse, reply_recommended
     return "Review and decide."
 
 
+def _parse_body(req: ConciergeEmailRequest):
+    if not req.body and req.body_html:
+        req.body = html_to_text(req.body_html)
+
+
 @app.post("/concierge-email", response_model=ConciergeEmailResponse)
 def concierge_email(req: ConciergeEmailRequest):
 
+    # Visible text via a regex strip; the full HTML parse only happens on a dedupe miss
+    text = req.body or visible_text(req.body_html or "")
+
+    # Optional learned pick, scored once on that text: part of the dedupe key,
+    # and passed to classify on a miss instead of scoring again
+    pick = None
+    if learned_model is not None and not req.body_truncated:
+        pick = _learned_level(req.sender, req.subject, text)
+
+    # 0) Near-duplicate check: reuse the cached decision for repeated blasts.
+    # Replies/known contacts always go through the full path (rules 1-2, drafting).
+    fp = None
+    if DEDUPE_ENABLED and not req.body_truncated and not req.is_reply_to_user and not req.known_contact:
+        fp = email_fingerprint(req.sender, req.subject, text)
+        extra = (pick[0] if pick else None,) if learned_model is not None else ()
+        hints = decision_hints(req, text, extra)
+        with dedupe_lock:
+            cached = dedupe_index.lookup(fp, hints)
+        if cached is not None:
+            return ConciergeEmailResponse(**cached, near_duplicate=True)
+        started = time.perf_counter()
+
+    _parse_body(req)
+
     # 1) Classify using deterministic ladder
     classification = _classify(ClassifyEmailRequest(
         sender=req.sender,
@@ -187,11 +167,26 @@ def concierge_email(req: ConciergeEmailRequest):
         human_sender=req.human_sender,
         is_transactional=req.is_transactional,
         is_newsletter=req.is_newsletter,
-    ))
+        body_truncated=req.body_truncated,
+    ), lambda _req: pick)
 
     # 2) Decide whether a reply is recommended
     reply_recommended = _should_reply(classification, req)
     action = _recommended_action(classification, reply_recommended)
+    # Work a dedupe hit skips (parse + classify); stopped before any drafting
+    miss_seconds = time.perf_counter() - started if fp is not None else 0.0
+
+    # Preview-only input: never draft from a truncated body; ask for the full one
+    if req.body_truncated and (classification.needs_full_body or reply_recommended):
+        return ConciergeEmailResponse(
+            priority_level=classification.priority_level,
+            folder=classification.folder,
+            notify=classification.notify,
+            reason=classification.reason,
+            recommended_action=action,
+            reply_recommended=reply_recommended,
+            needs_full_body=True,
+        )
 
     # 3) Optionally draft a reply (never send)
     draft_text = None
@@ -216,7 +211,7 @@ User notes (optional):
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"OpenAI error (drafting): {e}")
 
-    return ConciergeEmailResponse(
+    result = ConciergeEmailResponse(
         priority_level=classification.priority_level,
         folder=classification.folder,
         notify=classification.notify,
@@ -225,3 +220,11 @@ User notes (optional):
         reply_recommended=reply_recommended,
         draft=draft_text,
     )
+
+    # Only cache (and time) decisions that need no draft; a hit must never skip a reply
+    if fp is not None and not reply_recommended:
+        with dedupe_lock:
+            dedupe_index.record_miss_cost(miss_seconds)
+            dedupe_index.add(fp, hints, result.model_dump(exclude={"near_duplicate"}))
+
+    return result
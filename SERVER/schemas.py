@@ -18,15 +18,24 @@ class ClassifyEmailRequest(BaseModel):
     is_newsletter: bool = False
     human_sender: bool = False
 
+    # True when body is only a preview (e.g. Graph bodyPreview), not the full text
+    body_truncated: bool = False
+
 class ClassifyEmailResponse(BaseModel):
     priority_level: str
     folder: str
     notify: bool
     reason: str
+
+    # Set on truncated input when the rest of the body could change the decision
+    needs_full_body: bool = False
 class ConciergeEmailRequest(BaseModel):
     sender: str
     subject: str
-    body: str
+    body: str = ""
+
+    # Raw HTML body (e.g. from Graph); parsed server-side only if not a near-duplicate
+    body_html: str | None = None
     human_sender: bool = False
 
     # Optional hints (can be set by integrations later)
@@ -38,6 +47,9 @@ class ConciergeEmailRequest(BaseModel):
     # Optional user intent/context
     user_notes: str | None = None
 
+    # True when body is only a preview; the concierge won't draft from it
+    body_truncated: bool = False
+
 
 class ConciergeEmailResponse(BaseModel):
     priority_level: str
@@ -49,3 +61,9 @@ class ConciergeEmailResponse(BaseModel):
     recommended_action: str
     reply_recommended: bool
     draft: str | None = None
+
+    # True when the decision was reused from a near-duplicate (see dedupe.py)
+    near_duplicate: bool = False
+
+    # Truncated input only: caller should resend with the full body
+    needs_full_body: bool = False
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Server modules import each other flat (e.g. `from schemas import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import archive_ingest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MBOX = (
+    b"From alice@example.com Mon Jan  1 00:00:00 2024\n"
+    b"From: Alice <alice@gmail.com>\n"
+    b"Subject: lunch?\n"
+    b"\n"
+    b"Want to grab lunch?\n"
+    b">From the office, maybe.\n"
+    b"Thanks,\nAlice\n"
+    b"\n"
+    b"From shop@example.com Mon Jan  1 00:00:01 2024\n"
+    b"From: Shop <news@shop.com>\n"
+    b"Subject: =?utf-8?q?Flash_sale_=E2=80=94_today?=\n"
+    b"List-Unsubscribe: <mailto:u@shop.com>\n"
+    b"MIME-Version: 1.0\n"
+    b"Content-Type: multipart/alternative; boundary=XX\n"
+    b"\n"
+    b"--XX\n"
+    b"Content-Type: text/html; charset=iso-8859-1\n"
+    b"Content-Transfer-Encoding: quoted-printable\n"
+    b"\n"
+    b"<html><body><p>Caf=E9 deals</p><script>x()</script></body></html>\n"
+    b"--XX--\n"
+    b"\n"
+    b"From store@example.com Mon Jan  1 00:00:02 2024\n"
+    b"From: Store <orders@store.com>\n"
+    b"Subject: Your receipt\n"
+    b"\n"
+    b"Order 123 confirmed.\n"
+)
+
+
+@pytest.fixture
+def mbox_path(tmp_path):
+    path = tmp_path / "archive.mbox"
+    path.write_bytes(MBOX)
+    return str(path)
+
+
+def test_mbox_spans_split_on_from_lines_only(mbox_path):
+    spans = list(archive_ingest.iter_mbox_spans(mbox_path))
+    assert len(spans) == 3
+    first = MBOX[spans[0][1]:spans[0][2]]
+    assert first.startswith(b"From: Alice")
+    assert b">From the office" in first
+
+
+def test_empty_mbox_has_no_spans(tmp_path):
+    path = tmp_path / "empty.mbox"
+    path.write_bytes(b"")
+    assert list(archive_ingest.iter_mbox_spans(str(path))) == []
+
+
+def test_triage_decodes_headers_and_html_parts(mbox_path):
+    rows = archive_ingest.triage_chunk(list(archive_ingest.iter_mbox_spans(mbox_path)))
+    alice, shop, store = rows
+
+    assert alice["priority_level"] == "NOTIFY (NON-URGENT)"
+    assert shop["subject"] == "Flash sale — today"
+    assert shop["is_newsletter"] is True
+    assert shop["priority_level"] == "IGNORE / AUTO-ARCHIVE"
+    assert store["priority_level"] == "LOG SILENTLY"
+    assert not any(r["error"] for r in rows)
+
+
+def test_eml_directories_are_walked(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.eml").write_bytes(b"From: a@b.com\nSubject: hi\n\nhello\n")
+    (tmp_path / "notes.txt").write_text("not mail")
+    jobs = list(archive_ingest.iter_jobs([str(tmp_path)]))
+    assert jobs == [(str(tmp_path / "sub" / "a.eml"), 0, -1)]
+
+
+def test_ingest_writes_all_rows(mbox_path, tmp_path):
+    out = tmp_path / "out.jsonl"
+    counts = archive_ingest.ingest([mbox_path], str(out), workers=1)
+    assert counts["messages"] == 3
+    assert len(out.read_text(encoding="utf-8").splitlines()) == 3
+
+
+def test_ingest_parent_error_does_not_hang(mbox_path, tmp_path, monkeypatch):
+    def boom(self, rows):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(archive_ingest, "WRITE_BATCH", 1)
+    monkeypatch.setattr(archive_ingest.RowWriter, "write_rows", boom)
+    with pytest.raises(RuntimeError, match="disk full"):
+        archive_ingest.ingest([mbox_path] * 50, str(tmp_path / "out.csv"), workers=1)
+
+
+def test_imports_without_openai_key_or_graph_client():
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    check = "import archive_ingest, sys; sys.exit(sorted({'main', 'graph_thintegration', 'msal', 'dotenv'} & set(sys.modules)) or None)"
+    proc = subprocess.run(
+        [sys.executable, "-c", check],
+        cwd=SERVER_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,156 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from dedupe import DEFAULT_MAX_DISTANCE, FingerprintIndex, email_fingerprint, hamming
+from html_text import visible_text
+
+WORDS = (
+    "this month at acme we shipped faster search a new dashboard and better exports "
+    "read the full story on our blog and tell us what you think about the roadmap "
+    "our team also published a guide to onboarding plus tips for admins and builders "
+)
+BODY = "Hi {name}, " + WORDS * 4 + "Unsubscribe | View in browser"
+HINTS = (False,) * 10
+STYLE = "<style>" + " ".join(f".c{i} {{ color: #333; padding: {i}px; font-family: Arial; }}" for i in range(60)) + "</style>"
+TEMPLATE = "<html><head>" + STYLE + "</head><body><p>%s</p><p>Unsubscribe</p></body></html>"
+
+
+@pytest.fixture
+def main_module(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", "test-key"))
+    import main
+
+    monkeypatch.setattr(main, "dedupe_index", FingerprintIndex())
+    return main
+
+
+@pytest.fixture
+def client(main_module):
+    return TestClient(main_module.app)
+
+
+def _post(client, **kw):
+    payload = {"sender": "Acme <news@acme.com>", "subject": "Acme monthly update", "body": BODY.format(name="Frank")}
+    payload.update(kw)
+    r = client.post("/concierge-email", json=payload)
+    r.raise_for_status()
+    return r.json()
+
+
+def test_personalized_copies_are_near_duplicates():
+    a = email_fingerprint("news@acme.com", "Update", BODY.format(name="Frank") + " id=8f7e6d5c4b3a2918")
+    b = email_fingerprint("news@acme.com", "Update", BODY.format(name="Maria") + " id=0011223344556677")
+    other = email_fingerprint("bob@gmail.com", "lunch?", "want to grab lunch tomorrow? thanks, bob")
+    assert hamming(a, b) <= 6
+    assert hamming(a, other) > 6
+
+
+def test_repeat_blast_reuses_cached_decision(client):
+    first = _post(client)
+    second = _post(client, body=BODY.format(name="Maria"))
+    assert first["priority_level"] == second["priority_level"] == "BATCH FOR LATER"
+    assert (first["near_duplicate"], second["near_duplicate"]) == (False, True)
+    stats = client.get("/dedupe-stats").json()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_subject_that_changes_rule_is_not_a_hit(client, main_module):
+    _post(client)
+    invoice = _post(client, subject="Acme monthly invoice")
+    assert invoice["near_duplicate"] is False
+    assert invoice["priority_level"] == "LOG SILENTLY"
+
+
+def test_shared_style_block_is_not_a_near_duplicate(client):
+    arrivals = TEMPLATE % "New arrivals are here: see what landed in the shop this week."
+    flash = TEMPLATE % "Flash sale today only: 40% off everything in the shop."
+    fps = [email_fingerprint("news@acme.com", "Acme", visible_text(h)) for h in (arrivals, flash)]
+    assert hamming(*fps) > DEFAULT_MAX_DISTANCE
+
+    assert _post(client, body="", body_html=arrivals)["priority_level"] == "BATCH FOR LATER"
+    second = _post(client, body="", body_html=flash)
+    assert second["near_duplicate"] is False
+    assert second["priority_level"] == "IGNORE / AUTO-ARCHIVE"
+
+
+def test_body_promo_phrase_is_not_a_hit(client):
+    plain = BODY.format(name="Frank")
+    promo = plain + " Members get 20% off."
+    # Close enough to match on the fingerprint alone; the body flags in the key split them
+    assert hamming(email_fingerprint("news@acme.com", "Acme monthly update", plain),
+                   email_fingerprint("news@acme.com", "Acme monthly update", promo)) <= DEFAULT_MAX_DISTANCE
+
+    assert _post(client, body=plain)["priority_level"] == "BATCH FOR LATER"
+    second = _post(client, body=promo)
+    assert second["near_duplicate"] is False
+    assert second["priority_level"] == "IGNORE / AUTO-ARCHIVE"
+
+
+def test_drafting_miss_is_not_timed(client, main_module, monkeypatch):
+    def slow_draft(**kw):
+        time.sleep(0.3)
+        return SimpleNamespace(output_text="Draft reply (AI): thanks!")
+
+    fake = SimpleNamespace(responses=SimpleNamespace(create=slow_draft))
+    monkeypatch.setattr(main_module, "client", fake)
+
+    drafted = _post(client, sender="Sam <sam@gmail.com>", subject="coffee?", body="Free Tuesday? Thanks, Sam",
+                    human_sender=True)
+    assert drafted["draft"]
+    _post(client)
+    _post(client, body=BODY.format(name="Maria"))
+
+    stats = client.get("/dedupe-stats").json()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["avg_miss_ms"] < 100
+
+
+def test_html_body_is_parsed_only_on_miss(client, main_module, monkeypatch):
+    calls = []
+    real = main_module.html_to_text
+    monkeypatch.setattr(main_module, "html_to_text", lambda html: calls.append(1) or real(html))
+
+    html = "<html><body><p>{}</p></body></html>"
+    first = _post(client, body="", body_html=html.format(BODY.format(name="Frank")))
+    second = _post(client, body="", body_html=html.format(BODY.format(name="Maria")))
+    assert first["priority_level"] == "BATCH FOR LATER"
+    assert second["near_duplicate"] is True
+    assert len(calls) == 1
+
+
+def test_hint_mismatch_counts_as_miss_without_promotion():
+    index = FingerprintIndex(capacity=2)
+    fp = email_fingerprint("news@acme.com", "Update", BODY.format(name="Frank"))
+    other = email_fingerprint("news@other.com", "Other", "completely different text about gardening")
+    index.add(fp, HINTS, {"priority_level": "BATCH FOR LATER"})
+    index.add(other, HINTS, {"priority_level": "IGNORE / AUTO-ARCHIVE"})
+
+    assert index.lookup(fp, (True,) + HINTS[1:]) is None
+    index.record_miss_cost(0.5)
+    stats = index.stats()
+    assert stats["hits"] == 0 and stats["hit_rate"] == 0.0 and stats["est_time_saved_ms"] == 0.0
+
+    # The rejected entry wasn't promoted: adding a third evicts it (oldest)
+    index.add(email_fingerprint("x@y.com", "z", "yet another unrelated message body"), HINTS, {})
+    assert index.lookup(fp, HINTS) is None
+    assert index.lookup(other, HINTS) is not None
+
+
+def test_eviction_cleans_band_buckets():
+    index = FingerprintIndex(capacity=1)
+    a = email_fingerprint("a@a.com", "a", "alpha beta gamma delta epsilon")
+    b = email_fingerprint("b@b.com", "b", "one two three four five six")
+    index.add(a, HINTS, {})
+    index.add(b, HINTS, {})
+    assert len(index) == 1
+    keys = set().union(*(bucket for band in index._bands for bucket in band.values()))
+    assert keys == {(b, HINTS)}
+
+
+def test_max_distance_must_fit_bands():
+    with pytest.raises(ValueError):
+        FingerprintIndex(max_distance=8)
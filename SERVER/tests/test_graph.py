@@ -0,0 +1,95 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+import graph_thintegration as graph
+from dedupe import FingerprintIndex
+
+
+def _msg(msg_id, sender, subject, preview, headers=()):
+    return {
+        "id": msg_id,
+        "subject": subject,
+        "from": {"emailAddress": {"name": sender.split("@")[0], "address": sender}},
+        "bodyPreview": preview,
+        "conversationId": f"conv-{msg_id}",
+        "internetMessageHeaders": [{"name": k, "value": v} for k, v in headers],
+    }
+
+
+INBOX = [
+    _msg("promo", "news@shop.com", "Flash sale ends today", "Everything 40% off.",
+         [("List-Unsubscribe", "<mailto:u@shop.com>")]),
+    _msg("receipt", "no-reply@store.com", "Your receipt", "Order 123 confirmed."),
+    _msg("human", "sam@gmail.com", "coffee?", "Free Tuesday? Thanks, Sam"),
+]
+
+
+@pytest.fixture
+def fake_graph(monkeypatch):
+    urls = []
+
+    def fake_get(url, headers=None, timeout=None):
+        urls.append(url)
+        if "/mailFolders/inbox/messages" in url:
+            msgs = INBOX if "internetMessageHeaders" in url else [
+                {k: v for k, v in m.items() if k != "internetMessageHeaders"} for m in INBOX
+            ]
+            data = {"value": msgs}
+        elif "conversationId" in url and "$filter" in url:
+            data = {"value": []}
+        else:
+            msg_id = url.split("/me/messages/")[1].split("?")[0]
+            data = {"id": msg_id, "body": {"contentType": "text", "content": "Free Tuesday? " * 50 + "Thanks, Sam"}}
+        r = requests.Response()
+        r.status_code = 200
+        r._content = json.dumps(data).encode("utf-8")
+        return r
+
+    monkeypatch.setattr(graph.requests, "get", fake_get)
+    monkeypatch.setattr(graph, "GRAPH_STATS", {"calls": 0, "bytes": 0})
+
+    # Tier 1/2 posts go to the real server app, with a stub OpenAI client for drafts
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", "test-key"))
+    import main
+
+    monkeypatch.setattr(main, "dedupe_index", FingerprintIndex())
+    monkeypatch.setattr(main, "client", SimpleNamespace(responses=SimpleNamespace(
+        create=lambda **kw: SimpleNamespace(output_text="Draft reply (AI): Tuesday works."))))
+    server = TestClient(main.app)
+
+    def post(payload):
+        r = server.post("/concierge-email", json=payload)
+        r.raise_for_status()
+        return r.json()
+
+    monkeypatch.setattr(graph, "post_concierge", post)
+    return urls
+
+
+def test_headers_come_from_the_list_response(fake_graph):
+    msgs = graph.list_inbox("t")
+    payload = graph.metadata_payload("t", msgs[0], "me@example.com")
+    assert payload["is_newsletter"] is True and payload["human_sender"] is False
+    assert not any("$select=internetMessageHeaders" in url for url in fake_graph)
+
+
+def test_body_fetched_only_when_server_asks(fake_graph):
+    fetched = {}
+    for m in graph.list_inbox("t"):
+        concierge, fetched[m["id"]] = graph.concierge_message("t", m, graph.metadata_payload("t", m, "me@example.com"))
+        if m["id"] == "human":
+            assert concierge["draft"]
+    assert fetched == {"promo": False, "receipt": False, "human": True}
+
+
+def test_measure_reports_fewer_calls_and_bodies(fake_graph, capsys):
+    graph.measure("t", "me@example.com", 3)
+    out = capsys.readouterr().out
+    # before: list + (full message + conversation) x3; after: list + conversation x3 + 1 body
+    assert "Calls: 7 -> 5" in out
+    assert "Full bodies fetched: 3 -> 1" in out
@@ -0,0 +1,150 @@
+import csv
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import archive_ingest
+import learned
+from ladder import classify
+from schemas import ClassifyEmailRequest
+
+FIELDS = ["sender", "subject", "body_preview", "priority_level", "learned_level", "my_override", "error"]
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
+        w.writeheader()
+        for r in rows:
+            w.writerow({k: r.get(k, "") for k in FIELDS})
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Batch", "BATCH FOR LATER"),
+    ("  ignore ", "IGNORE / AUTO-ARCHIVE"),
+    ("archive", "IGNORE / AUTO-ARCHIVE"),
+    ("5 - Ignore (Promo)", "IGNORE / AUTO-ARCHIVE"),
+    ("notify (non-urgent)", "NOTIFY (NON-URGENT)"),
+    ("Low", None),
+    ("High", None),
+    ("i", None),
+    ("", None),
+])
+def test_normalize_label(value, expected):
+    assert learned.normalize_label(value) == expected
+
+
+def test_read_decisions_skips_unrecognized_overrides(tmp_path):
+    path = tmp_path / "log.csv"
+    _write_csv(path, [
+        {"sender": "a@shop.com", "priority_level": "IGNORE / AUTO-ARCHIVE", "my_override": "Low"},
+        {"sender": "b@shop.com", "priority_level": "IGNORE / AUTO-ARCHIVE", "my_override": "4 - Batch Read"},
+        {"sender": "c@shop.com", "priority_level": "LOG SILENTLY", "learned_level": "BATCH FOR LATER"},
+        {"sender": "d@shop.com", "priority_level": "LOG SILENTLY", "error": "ValueError: x"},
+    ])
+    skipped = {}
+    data = list(learned.read_decisions([str(path)], skipped))
+
+    assert skipped == {"Low": 1}
+    assert [(label, weight) for _, label, weight in data] == [
+        ("BATCH FOR LATER", learned.OVERRIDE_WEIGHT),
+        ("LOG SILENTLY", 1.0),  # ladder label, not the model's learned_level
+    ]
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    rows, labels = [], []
+    for i in range(40):
+        rows.append((f"Shop <news@shop{i % 3}.com>", "New arrivals", "fresh styles this week"))
+        labels.append("BATCH FOR LATER")
+        rows.append((f"Deals <promo@deals{i % 3}.com>", "Clearance", "everything must go"))
+        labels.append("IGNORE / AUTO-ARCHIVE")
+    model = learned.train(rows, labels, epochs=80)
+    prefix = str(tmp_path / "model")
+    model.save(prefix)
+    return prefix
+
+
+def test_train_save_and_memmap_load(model_path):
+    model = learned.load_model(model_path)
+    assert isinstance(model.weights, np.memmap)
+    preds = model.predict([
+        ("Shop <news@shop1.com>", "New arrivals", "fresh styles this week"),
+        ("Deals <promo@deals2.com>", "Clearance", "everything must go"),
+    ])
+    assert [label for label, _ in preds] == ["BATCH FOR LATER", "IGNORE / AUTO-ARCHIVE"]
+    assert all(p > 0.8 for _, p in preds)
+
+
+def test_batch_scoring_matches_single_rows(model_path):
+    model = learned.load_model(model_path)
+    rows = [(f"x{i}@shop{i % 3}.com", f"subject {i}", "fresh styles" * (i % 4)) for i in range(50)]
+    batch = model.predict_proba(rows)
+    singles = np.vstack([model.predict_proba([r]) for r in rows])
+    assert np.allclose(batch, singles, atol=1e-5)
+
+
+def test_load_model_disabled_without_path(tmp_path):
+    assert learned.load_model("") is None
+    assert learned.load_model(str(tmp_path / "missing")) is None
+
+
+def test_learned_stage_not_run_on_preview():
+    calls = []
+
+    def fake_learned(req):
+        calls.append(req)
+        return ("BATCH FOR LATER", 0.99)
+
+    req = ClassifyEmailRequest(sender="a@shop.com", subject="Big sale", body="30% off", body_truncated=True)
+    preview = classify(req, fake_learned)
+    assert preview.needs_full_body is True and calls == []
+
+    full = classify(ClassifyEmailRequest(sender="a@shop.com", subject="Big sale", body="30% off"), fake_learned)
+    assert full.priority_level == "BATCH FOR LATER" and len(calls) == 1
+
+
+def test_archive_logs_ladder_and_learned_separately(model_path, tmp_path, monkeypatch):
+    eml = tmp_path / "m.eml"
+    eml.write_bytes(b"From: Shop <news@shop1.com>\nSubject: New arrivals\n\nfresh styles this week\n")
+
+    calls = []
+    real = learned.LinearModel.predict_proba_csr
+    monkeypatch.setattr(learned.LinearModel, "predict_proba_csr", lambda self, *a: calls.append(1) or real(self, *a))
+
+    archive_ingest._init_worker("", model_path, 0.8)
+    try:
+        rows = archive_ingest.triage_chunk([(str(eml), 0, -1)] * 10)
+    finally:
+        archive_ingest._init_worker("")
+
+    assert len(calls) == 1  # one vectorized call per chunk
+    assert {r["priority_level"] for r in rows} == {"IGNORE / AUTO-ARCHIVE"}  # pure ladder
+    assert {r["learned_level"] for r in rows} == {"BATCH FOR LATER"}
+
+
+def test_concierge_scores_once_and_hit_skips_parse(model_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", "test-key"))
+    import main
+    from dedupe import FingerprintIndex
+    from fastapi.testclient import TestClient
+
+    scores, parses = [], []
+    real_score, real_parse = learned.LinearModel.predict_proba_csr, main.html_to_text
+    monkeypatch.setattr(learned.LinearModel, "predict_proba_csr", lambda self, *a: scores.append(1) or real_score(self, *a))
+    monkeypatch.setattr(main, "html_to_text", lambda html: parses.append(1) or real_parse(html))
+    monkeypatch.setattr(main, "learned_model", learned.load_model(model_path))
+    monkeypatch.setattr(main, "dedupe_index", FingerprintIndex())
+
+    client = TestClient(main.app)
+    payload = {"sender": "Shop <news@shop1.com>", "subject": "New arrivals",
+               "body_html": "<html><head><style>p { color: red }</style></head><body><p>fresh styles this week</p></body></html>"}
+    first = client.post("/concierge-email", json=payload).json()
+    assert first["priority_level"] == "BATCH FOR LATER" and len(scores) == 1 and len(parses) == 1
+
+    second = client.post("/concierge-email", json=payload).json()
+    assert second["near_duplicate"] is True
+    assert len(scores) == 2 and len(parses) == 1  # the hit scored (for its key) but didn't parse
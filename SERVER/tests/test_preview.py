@@ -0,0 +1,58 @@
+import itertools
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ladder import classify
+from schemas import ClassifyEmailRequest
+
+PREVIEW_CHARS = 255  # Graph bodyPreview length
+FILLER = "Here is what happened this week across the team and the product. " * 5
+SNIPPETS = ["", "Flash sale: 30% off everything.", "Unsubscribe | View in browser", "Thanks,\nSam"]
+SUBJECTS = ["Weekly notes", "Your receipt", "Big deal inside"]
+SENDERS = ["Acme <news@acme.com>", "Acme <no-reply@acme.com>"]
+
+
+def _bodies():
+    # Each snippet either inside the preview window or past it
+    for head, tail in itertools.product(SNIPPETS, SNIPPETS):
+        yield f"{head} {FILLER}{tail}"
+
+
+def _req(sender, subject, body, truncated, **hints):
+    return ClassifyEmailRequest(sender=sender, subject=subject, body=body, body_truncated=truncated, **hints)
+
+
+@pytest.mark.parametrize("sender", SENDERS)
+@pytest.mark.parametrize("subject", SUBJECTS)
+@pytest.mark.parametrize("is_newsletter", [False, True])
+@pytest.mark.parametrize("human_sender", [False, True])
+def test_final_preview_decisions_match_full_body(sender, subject, is_newsletter, human_sender):
+    hints = {"is_newsletter": is_newsletter, "human_sender": human_sender}
+    for body in _bodies():
+        preview = classify(_req(sender, subject, body[:PREVIEW_CHARS], True, **hints))
+        full = classify(_req(sender, subject, body, False, **hints))
+        if not preview.needs_full_body:
+            assert preview.priority_level == full.priority_level, body
+        assert not full.needs_full_body
+
+
+def test_body_only_signal_requires_full_body():
+    body = FILLER + " " + "Flash sale: 30% off everything."
+    preview = classify(_req("Acme <news@acme.com>", "Weekly notes", body[:PREVIEW_CHARS], True, is_newsletter=True))
+    full = classify(_req("Acme <news@acme.com>", "Weekly notes", body, False, is_newsletter=True))
+    assert preview.priority_level == "BATCH FOR LATER" and preview.needs_full_body
+    assert full.priority_level == "IGNORE / AUTO-ARCHIVE"
+
+
+def test_concierge_never_drafts_from_preview(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", "test-key"))
+    import main
+
+    client = TestClient(main.app)
+    r = client.post("/concierge-email", json={
+        "sender": "Sam <sam@gmail.com>", "subject": "coffee?", "body": "Free Tuesday?",
+        "human_sender": True, "body_truncated": True,
+    }).json()
+    assert r["needs_full_body"] is True and r["draft"] is None